@@ -0,0 +1,92 @@
+import numpy as np
+from dp import dp_solution_batched, dp_solution_with_moves, dist_matrix, compute_bulges_indents, backtrack_connections
+
+
+def batched_dist_and_masks(points_1, points_2, n_points):
+    """
+    Computes the distance matrices and bulge/indent masks of a group of row pairs that share the same m.
+
+    Mirrors `dist_matrix` and `compute_bulges_indents` operation for operation, so the results are bit-identical
+    to calling them on every pair. The rows of A are padded with zeros up to the largest n of the group; padded
+    entries are never read by the DP cells of the real pairs.
+
+    Parameters:
+    points_1 (np.ndarray): Padded A rings of shape (batch, 3, n_max).
+    points_2 (np.ndarray): B rings of shape (batch, 3, m).
+    n_points (np.ndarray): Actual number of points of every A ring, shape (batch,).
+
+    Returns:
+    tuple: Distances of shape (batch, n_max, m), bulge and indent masks of shape (batch, n_max).
+    """
+    n_max = points_1.shape[2]
+    valid = np.arange(n_max) < n_points[:, np.newaxis]
+
+    diff = points_1.transpose(0, 2, 1)[:, :, np.newaxis, :] - points_2.transpose(0, 2, 1)[:, np.newaxis, :, :]
+    dist = np.sqrt(np.sum(diff ** 2, axis=3))
+
+    # np.mean on each unpadded ring, as the padding would change its summation order
+    centroid_A = np.stack([points_1[b, :, :n].mean(axis=1) for b, n in enumerate(n_points)])[:, :, np.newaxis]
+    ai_to_centroid = np.sqrt(np.sum((points_1 - centroid_A) ** 2, axis=1))
+
+    # Indices of the 3 nearest neighbours in B for each point in A (every row has length m, as in the serial path)
+    nearest = np.argsort(dist, axis=2)[:, :, :3]
+
+    # (batch, n_max, 3, 3): nearest points of B relative to the centroid of A. The stacked matmul gives the same
+    # dot product as np.linalg.norm on each vector
+    nearest_points = np.take_along_axis(points_2[:, np.newaxis, :, :], nearest[:, :, np.newaxis, :], axis=3)
+    offsets = (nearest_points - centroid_A[:, np.newaxis, :, :]).transpose(0, 1, 3, 2)[..., np.newaxis]
+    distances_to_centroid_B = np.sqrt((offsets.swapaxes(-1, -2) @ offsets)[..., 0, 0])
+
+    is_bulge = np.all(distances_to_centroid_B > ai_to_centroid[:, :, np.newaxis], axis=2) & valid
+    is_indent = np.all(distances_to_centroid_B < ai_to_centroid[:, :, np.newaxis], axis=2) & valid
+
+    return dist, is_bulge, is_indent
+
+
+def solve_row_pairs(pairs, W, alpha=30, beta=30, max_points=20):
+    """
+    Solves many row pairs, batching the small ones to avoid per-call overhead.
+
+    Pairs with at most `max_points` points on both rings are grouped by the size of their B ring, their A rings
+    are padded to the largest one of the group, and distances, masks and the DP run once for the whole group.
+    Larger pairs are solved one by one. The connections are identical to `dp_solution_with_shape_info`'s
+    `path[(n, m)]` for every pair.
+
+    Parameters:
+    pairs (list): (points_1, points_2) tuples of (3, n) and (3, m) arrays.
+    W (float): Stitch width.
+    alpha (float): Penalty for an unnecessary increase.
+    beta (float): Penalty for an unnecessary decrease.
+    max_points (int): Largest ring size that is batched.
+
+    Returns:
+    list: The connection strings of every pair, in input order.
+    """
+    connections = [None] * len(pairs)
+
+    groups = {}
+    for index, (points_1, points_2) in enumerate(pairs):
+        n = points_1.shape[1]
+        m = points_2.shape[1]
+        if n <= max_points and m <= max_points:
+            groups.setdefault(m, []).append(index)
+        else:
+            dist = dist_matrix(points_1, points_2)
+            is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
+            _, moves = dp_solution_with_moves(n, m, dist, W, is_bulge, is_indent, alpha, beta)
+            connections[index] = backtrack_connections(moves, n, m)
+
+    for m, indices in groups.items():
+        n_points = np.array([pairs[index][0].shape[1] for index in indices])
+        points_1 = np.zeros((len(indices), 3, n_points.max()))
+        for b, index in enumerate(indices):
+            points_1[b, :, :n_points[b]] = pairs[index][0]
+        points_2 = np.stack([pairs[index][1] for index in indices])
+
+        dist, is_bulge, is_indent = batched_dist_and_masks(points_1, points_2, n_points)
+        _, moves = dp_solution_batched(dist, W, is_bulge, is_indent, alpha, beta)
+
+        for b, index in enumerate(indices):
+            connections[index] = backtrack_connections(moves[b], n_points[b], m)
+
+    return connections
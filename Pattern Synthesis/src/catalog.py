@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from main import load_json, get_segments, write_model_pattern
+
+
+def load_manifest(manifest_path):
+    """
+    Loads a catalogue manifest.
+
+    The manifest is a json file of the form
+        {"models": [{"name": "cactus", "folder": "path/to/cactus",
+                     "metadata": {"cactus_main.json": [["cactus_left.json", 1], ["cactus_right.json", 1]]}}, ...]}
+    where "metadata" follows the format used in main() (0 = sew-on, 1 = attach separately). If "metadata"
+    is a string it is read as a json file, and if it is missing `<folder>/metadata.json` is used when present.
+    Relative folders are resolved against the manifest's directory.
+    """
+    manifest = load_json(manifest_path)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    models = []
+    for model in manifest['models']:
+        folder_path = os.path.join(base_dir, model['folder'])
+        metadata = model.get('metadata', os.path.join(folder_path, 'metadata.json'))
+        if isinstance(metadata, str):
+            metadata_path = os.path.join(base_dir, metadata)
+            metadata = load_json(metadata_path) if os.path.exists(metadata_path) else {}
+        models.append({
+            'name': model.get('name', os.path.basename(os.path.normpath(folder_path))),
+            'folder': folder_path,
+            'metadata': metadata,
+        })
+
+    return models
+
+
+def load_checkpoint(checkpoint_path):
+    if os.path.exists(checkpoint_path):
+        return load_json(checkpoint_path)
+    return {'completed': [], 'offset': 0, 'done': False}
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    # Write to a temporary file first so a kill mid-write never leaves a corrupt checkpoint
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def run_model(model, output_dir):
+    """
+    Writes the crochet pattern of one model to `<output_dir>/crochet_pattern_<name>.txt`, resuming from its checkpoint.
+
+    The checkpoint records the completed segments and the size of the pattern file after the last one. On resume the
+    file is truncated back to that size, dropping any rows of a segment that was interrupted, and the completed
+    segments are skipped.
+
+    Returns:
+    tuple: The model name and 'done' or 'skipped' (already finished by an earlier run).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pattern_path = os.path.join(output_dir, f"crochet_pattern_{model['name']}.txt")
+    checkpoint_path = os.path.join(output_dir, f"crochet_pattern_{model['name']}.checkpoint.json")
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint['done']:
+        return model['name'], 'skipped'
+
+    segmented_parts = get_segments(model['folder'], echo=False)
+
+    with open(pattern_path, 'a') as file:
+        file.truncate(checkpoint['offset'])
+
+        def on_segment_done(segment_name):
+            file.flush()
+            checkpoint['completed'].append(segment_name)
+            checkpoint['offset'] = file.tell()
+            save_checkpoint(checkpoint_path, checkpoint)
+
+        write_model_pattern(segmented_parts, model['metadata'], file, completed_segments=set(checkpoint['completed']),
+                            on_segment_done=on_segment_done, echo=False)
+
+    checkpoint['done'] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+
+    return model['name'], 'done'
+
+
+def run_catalog(manifest_path, output_dir, max_workers=None):
+    """
+    Processes every model of a manifest with a bounded pool of worker processes.
+
+    Models that fail are reported and left with their checkpoint, so rerunning the same command resumes them.
+
+    Returns:
+    dict: Model name -> 'done', 'skipped' or the error message.
+    """
+    models = load_manifest(manifest_path)
+
+    status = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run_model, model, output_dir): model['name'] for model in models}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                status[name] = future.result()[1]
+            except Exception as e:
+                status[name] = f'failed: {e!r}'
+            print(f"{name}: {status[name]}")
+
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate crochet patterns for a catalogue of models.')
+    parser.add_argument('manifest', help='json manifest of model folders and their assembly metadata')
+    parser.add_argument('--output', default='Output', help='directory for pattern and checkpoint files')
+    parser.add_argument('--workers', type=int, default=None, help='maximum number of models processed at once')
+    args = parser.parse_args()
+
+    run_catalog(args.manifest, args.output, args.workers)
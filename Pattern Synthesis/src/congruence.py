@@ -0,0 +1,226 @@
+import numpy as np
+from utils import parse_connection
+
+
+def new_shape_index(tol=1e-3):
+    """
+    Creates an empty shape-signature index.
+
+    The DP only sees a row pair through its distance matrix and bulge/indent masks, and both are unchanged by any
+    translation, rotation about the slicing axis or mirroring applied to the two rings. The slicer orders each ring
+    by angle from -pi, so a rotated copy comes out with its start point shifted along the ring and a mirrored copy
+    with reversed winding. Each ring is therefore put into a canonical cyclic order (see `canonical_order`) before
+    the pair is hashed. Row pairs whose canonical distance matrices agree within `tol` and whose masks are equal are
+    solved once. The congruent pair reuses that plan, with its point indices remapped to its own order and put back
+    into its own working order (see `working_order`). A mirrored copy therefore gets the stitch sequence reversed,
+    and a rotated copy starts at its own a0 like a freshly solved row. The reused plan is the source's plan carried
+    over, which may differ from what a fresh solve in the copy's own order would choose.
+
+    Parameters:
+    tol (float): Largest allowed difference, in model units, between two distance matrix entries for row pairs to
+                 be treated as equal. The default of 1e-3 absorbs the float noise of exported, transformed copies
+                 while staying far below a stitch width; use e.g. 1e-9 to only reuse bit-exact copies.
+
+    Returns:
+    dict: The index, to be passed to `lookup_row_pair` / `add_row_pair` (or `iter_crochet_rows`).
+    """
+    return {'tol': tol, 'entries': {}, 'rows': {}}
+
+
+def canonical_order(points, tol):
+    """
+    Finds a start point and direction for a ring that do not depend on how the ring was rotated or mirrored.
+
+    Every start point and both directions are considered. The chosen one gives the lexicographically smallest
+    sequence of distances to the ring's centroid, quantized to `tol`. Only the start points with the smallest
+    distance can win, so only those are compared in full.
+
+    Parameters:
+    points (np.ndarray): An array of shape (3, n) with the ring's points in slicing order.
+    tol (float): Quantization step of the distances.
+
+    Returns:
+    np.ndarray: The permutation `order`, such that points[:, order] is the ring in canonical order.
+    """
+    radius = np.linalg.norm(points - points.mean(axis=1, keepdims=True), axis=0)
+    quantized = np.round(radius / tol).astype(np.int64).tolist()
+    n = len(quantized)
+
+    best_key, best_order = None, None
+    for start in [i for i in range(n) if quantized[i] == min(quantized)]:
+        for direction in (1, -1):
+            order = [(start + direction * k) % n for k in range(n)]
+            key = [quantized[i] for i in order]
+            if best_key is None or key < best_key:
+                best_key, best_order = key, order
+
+    return np.array(best_order)
+
+
+def canonical_row_pair(shape_index, points_1, points_2, dist, is_bulge, is_indent):
+    """
+    Reorders the DP inputs of a row pair into the canonical order of both rings.
+
+    The masks only depend on the set of points of B, so they just follow the order of A.
+
+    Returns:
+    tuple: The canonical orders of A and B, and the reordered distance matrix, bulge mask and indent mask.
+    """
+    order_1 = canonical_order(points_1, shape_index['tol'])
+    order_2 = canonical_order(points_2, shape_index['tol'])
+
+    return order_1, order_2, dist[np.ix_(order_1, order_2)], is_bulge[order_1], is_indent[order_1]
+
+
+def row_pair_signature(shape_index, dist, is_bulge, is_indent, params):
+    """
+    Builds the hash key of a row pair from its canonical DP inputs. Distances are quantized to the index tolerance,
+    so two row pairs within tolerance of each other can still land on different keys near a rounding boundary; they
+    are then simply solved twice, never wrongly reused.
+    """
+    quantized = np.round(dist / shape_index['tol']).astype(np.int64)
+    return (dist.shape, tuple(params), is_bulge.tobytes(), is_indent.tobytes(), quantized.tobytes())
+
+
+def remap_connections(connections, map_a, map_b):
+    """
+    Renames the point indices of connection strings, a{i} -> a{map_a[i]} and b{j} -> b{map_b[j]}.
+
+    Returns:
+    list: (a indices, b indices) tuples of every connection.
+    """
+    remapped = []
+    for connection in connections:
+        a_indices, b_indices = parse_connection(connection)
+        remapped.append(([int(map_a[i]) for i in a_indices], [int(map_b[j]) for j in b_indices]))
+
+    return remapped
+
+
+def format_connections(connections):
+    """
+    Writes (a indices, b indices) tuples back as connection strings, e.g. 'a3, a4 -> b4'.
+    """
+    return [', '.join(f'a{i}' for i in a_indices) + ' -> ' + ', '.join(f'b{j}' for j in b_indices)
+            for a_indices, b_indices in connections]
+
+
+def ring_direction(sequence, size):
+    """
+    Returns 1 if `sequence` walks a ring of `size` points upwards (i, i+1, ...), -1 if it walks downwards, 0 otherwise.
+    """
+    steps = {(b - a) % size for a, b in zip(sequence, sequence[1:] + sequence[:1])}
+    if steps == {1}:
+        return 1
+    if steps == {size - 1}:
+        return -1
+    return 0
+
+
+def working_order(connections, n, m):
+    """
+    Puts a plan remapped from a congruent row pair into this row pair's own working order.
+
+    A mirrored copy walks the plan with decreasing indices, so the plan (and the points inside each increase or
+    decrease) is reversed. A rotated copy starts part-way round the ring, so the plan is rotated to start at the
+    connection that works into a0, like a freshly solved row.
+
+    Parameters:
+    connections (list): (a indices, b indices) tuples in this row pair's point indices.
+    n (int): Number of points in set A.
+    m (int): Number of points in set B.
+
+    Returns:
+    list or None: The reordered tuples, or None if the plan does not walk both rings in one direction.
+    """
+    if not connections:
+        return connections
+
+    direction_a = ring_direction([i for a_indices, _ in connections for i in a_indices], n)
+    direction_b = ring_direction([j for _, b_indices in connections for j in b_indices], m)
+    if direction_a == 0 or direction_a != direction_b:
+        return None
+
+    if direction_a == -1:
+        connections = [(a_indices[::-1], b_indices[::-1]) for a_indices, b_indices in reversed(connections)]
+
+    first = next(k for k, (a_indices, _) in enumerate(connections) if 0 in a_indices)
+
+    return connections[first:] + connections[:first]
+
+
+def lookup_row_pair(shape_index, points_1, points_2, dist, is_bulge, is_indent, params, source):
+    """
+    Looks up the connections of an already solved congruent row pair and records the outcome for `source`.
+
+    Parameters:
+    shape_index (dict): Index from `new_shape_index`.
+    points_1 (np.ndarray): The first ring of the row pair (shape: (3, n)).
+    points_2 (np.ndarray): The second ring of the row pair (shape: (3, m)).
+    dist (np.ndarray): Distance matrix of the row pair.
+    is_bulge (np.ndarray): Bulge mask of the row pair.
+    is_indent (np.ndarray): Indent mask of the row pair.
+    params (tuple): The DP parameters (W, alpha, beta), which must match as well.
+    source (tuple): (segment name, row number) of the row pair being looked up.
+
+    Returns:
+    list or None: The reused connection strings in this row pair's point indices, or None if it has to be solved.
+    """
+    order_1, order_2, dist, is_bulge, is_indent = canonical_row_pair(shape_index, points_1, points_2, dist,
+                                                                     is_bulge, is_indent)
+    key = row_pair_signature(shape_index, dist, is_bulge, is_indent, params)
+    for entry in shape_index['entries'].get(key, []):
+        if np.max(np.abs(entry['dist'] - dist)) <= shape_index['tol']:
+            # Canonical position k is point order[k] of this row pair
+            connections = working_order(remap_connections(entry['connections'], order_1, order_2),
+                                        points_1.shape[1], points_2.shape[1])
+            if connections is None:
+                continue
+            shape_index['rows'][source] = entry['source']
+            return format_connections(connections)
+
+    return None
+
+
+def add_row_pair(shape_index, points_1, points_2, dist, is_bulge, is_indent, params, source, connections):
+    """
+    Stores the connections of a freshly solved row pair so congruent row pairs can reuse them.
+    The connections are stored in canonical point indices.
+    """
+    order_1, order_2, dist, is_bulge, is_indent = canonical_row_pair(shape_index, points_1, points_2, dist,
+                                                                     is_bulge, is_indent)
+    key = row_pair_signature(shape_index, dist, is_bulge, is_indent, params)
+    connections = format_connections(remap_connections(connections, np.argsort(order_1), np.argsort(order_2)))
+    shape_index['entries'].setdefault(key, []).append({'dist': dist, 'source': source, 'connections': connections})
+    shape_index['rows'][source] = None
+
+
+def dedup_report(shape_index):
+    """
+    Summarizes what was deduplicated.
+
+    Returns:
+    dict: A dictionary containing:
+        - 'solved' (int): Number of row pairs that were solved.
+        - 'reused' (list): (segment, row) -> (source segment, source row) pairs for every reused row.
+        - 'congruent_segments' (list): (segment, source segment) for segments whose rows were all reused,
+          row for row, from a single other segment.
+    """
+    rows = shape_index['rows']
+    reused = [(target, source) for target, source in rows.items() if source is not None]
+
+    segments = {}
+    for (segment, row), source in rows.items():
+        segments.setdefault(segment, []).append((row, source))
+
+    congruent_segments = []
+    for segment, seg_rows in segments.items():
+        sources = {source[0] if source and source[1] == row else None for row, source in seg_rows}
+        if len(sources) == 1 and None not in sources and segment not in sources:
+            congruent_segments.append((segment, sources.pop()))
+
+    return {
+        'solved': sum(source is None for source in rows.values()),
+        'reused': reused,
+        'congruent_segments': congruent_segments,
+    }
@@ -1,3 +1,4 @@
+import heapq
 import numpy as np
 
 def dist_matrix(xyz_1, xyz_2):
@@ -60,7 +61,7 @@ def compute_bulges_indents(points_A, points_B):
 
 
 
-def dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent):
+def dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent, alpha=30, beta=30):
     """
     Solve the dynamic programming problem with shape information for connecting points.
 
@@ -71,6 +72,8 @@ def dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent):
     W (float): Weight for penalty calculations.
     is_bulge (np.ndarray): Boolean array indicating which points in A are bulges.
     is_indent (np.ndarray): Boolean array indicating which points in A are indents.
+    alpha (float): Penalty for an increase on a point that is not a bulge.
+    beta (float): Penalty for a decrease on a point that is not an indent.
 
     Returns:
     tuple: A tuple containing:
@@ -84,10 +87,6 @@ def dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent):
     # Initialize path dictionary to store connections
     path = {(i, j): [] for i in range(n + 1) for j in range(m + 1)}
 
-    # Penalty factors
-    alpha = 30  # Penalty for unnecessary increase
-    beta = 30   # Penalty for unnecessary decrease
-
     # Fill the dp table
     for i in range(1, n + 1):
         for j in range(1, m + 1):
@@ -120,3 +119,424 @@ def dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent):
                     path[(i, j)] = path.get((i - 2, j - 1), []) + [f'a{i - 2}, a{i - 1} -> b{j - 1}']
 
     return dp, path
+
+
+# Move codes stored in the DP back-pointer tables
+SINGLE = 1    # a{i-1} -> b{j-1}
+INCREASE = 2  # a{i-1} -> b{j-2}, b{j-1}
+DECREASE = 3  # a{i-2}, a{i-1} -> b{j-1}
+
+# Offset (di, dj) from a cell back to its predecessor for each move
+MOVE_STEPS = {SINGLE: (1, 1), INCREASE: (1, 2), DECREASE: (2, 1)}
+
+
+def connection_label(move, i, j):
+    """
+    Build the connection string used in `path` for the move that ends at cell (i, j).
+
+    Parameters:
+    move (int): One of SINGLE, INCREASE or DECREASE.
+    i (int): Row of the DP cell.
+    j (int): Column of the DP cell.
+
+    Returns:
+    str: The connection string, e.g. 'a3 -> b4, b5'.
+    """
+    if move == SINGLE:
+        return f'a{i - 1} -> b{j - 1}'
+    if move == INCREASE:
+        return f'a{i - 1} -> b{j - 2}, b{j - 1}'
+    if move == DECREASE:
+        return f'a{i - 2}, a{i - 1} -> b{j - 1}'
+    raise ValueError(f'Invalid move code {move}.')
+
+
+def backtrack_connections(moves, n, m):
+    """
+    Follow a back-pointer table from (n, m) to (0, 0) and rebuild the connection list.
+
+    Parameters:
+    moves (np.ndarray): Back-pointer table of shape (n'+1, m'+1) with n' >= n and m' >= m.
+    n (int): Number of points in set A.
+    m (int): Number of points in set B.
+
+    Returns:
+    list: Connection strings in the same format as `path[(n, m)]`, or an empty list
+          if (n, m) is unreachable.
+    """
+    connections = []
+    i, j = n, m
+    while (i, j) != (0, 0):
+        move = int(moves[i, j])
+        if move == 0:
+            return []
+        connections.append(connection_label(move, i, j))
+        di, dj = MOVE_STEPS[move]
+        i, j = i - di, j - dj
+    connections.reverse()
+
+    return connections
+
+
+def dp_solution_batched(dist, W, is_bulge, is_indent, alpha=30, beta=30):
+    """
+    Solve the shape-aware DP for a whole batch of problems at once.
+
+    Every cell of the lattice is filled for all batch entries with one vectorised
+    update, so the Python loop runs (n+1)*(m+1) times regardless of the batch size.
+    The leading axes broadcast against each other: a single distance matrix can be
+    solved for many (W, alpha, beta) combinations, or many distance matrices for a
+    single set of parameters. Costs and tie-breaking match `dp_solution_with_shape_info`.
+
+    Parameters:
+    dist (np.ndarray): Distance matrices of shape (batch, n, m) or (n, m).
+    W (float or np.ndarray): Stitch width(s), scalar or shape (batch,).
+    is_bulge (np.ndarray): Bulge masks of shape (batch, n) or (n,).
+    is_indent (np.ndarray): Indent masks of shape (batch, n) or (n,).
+    alpha (float or np.ndarray): Increase penalty, scalar or shape (batch,).
+    beta (float or np.ndarray): Decrease penalty, scalar or shape (batch,).
+
+    Returns:
+    tuple: A tuple containing:
+        - dp (np.ndarray): DP tables of shape (batch, n+1, m+1) with minimum costs.
+        - moves (np.ndarray): Back-pointer tables of shape (batch, n+1, m+1), holding
+          SINGLE, INCREASE, DECREASE or 0 for unreachable cells.
+    """
+    dist = np.asarray(dist, dtype=float)
+    if dist.ndim == 2:
+        dist = dist[np.newaxis]
+    is_bulge = np.atleast_2d(is_bulge)
+    is_indent = np.atleast_2d(is_indent)
+    W, alpha, beta = (np.atleast_1d(np.asarray(v, dtype=float)) for v in (W, alpha, beta))
+
+    batch = np.broadcast_shapes(dist.shape[:1], is_bulge.shape[:1], is_indent.shape[:1],
+                                W.shape, alpha.shape, beta.shape)[0]
+    n, m = dist.shape[1], dist.shape[2]
+
+    # Penalties only depend on the row, so resolve them once for the whole table
+    inc_penalty = np.where(is_bulge, 0.0, alpha[:, np.newaxis]) * np.ones((batch, 1))
+    dec_penalty = np.where(is_indent, 0.0, beta[:, np.newaxis]) * np.ones((batch, 1))
+
+    dp = np.full((batch, n + 1, m + 1), np.inf)
+    dp[:, 0, 0] = 0
+    moves = np.zeros((batch, n + 1, m + 1), dtype=np.int8)
+
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            # Single connection
+            best = dp[:, i - 1, j - 1] + np.abs(dist[:, i - 1, j - 1] - W)
+            move = np.where(best < np.inf, SINGLE, 0)
+
+            # Increase connection
+            if j >= 3:
+                avg_dist = (dist[:, i - 1, j - 2] + dist[:, i - 1, j - 1]) / 2
+                cand = dp[:, i - 1, j - 2] + np.abs(avg_dist - W) + inc_penalty[:, i - 1]
+                better = cand < best
+                best = np.where(better, cand, best)
+                move = np.where(better, INCREASE, move)
+
+            # Decrease connection
+            if i >= 3 and j >= 2:
+                avg_dist = (dist[:, i - 2, j - 1] + dist[:, i - 1, j - 1]) / 2
+                cand = dp[:, i - 2, j - 1] + np.abs(avg_dist - W) + dec_penalty[:, i - 1]
+                better = cand < best
+                best = np.where(better, cand, best)
+                move = np.where(better, DECREASE, move)
+
+            dp[:, i, j] = best
+            moves[:, i, j] = move
+
+    return dp, moves
+
+
+def k_best_paths(n, m, dist, W, is_bulge, is_indent, k=None, alpha=30, beta=30):
+    """
+    Lazily enumerate the k best connection sequences of a row, cheapest first.
+
+    Uses the recursive enumeration algorithm of Jimenez and Marzal on the DP lattice: every cell keeps the sorted
+    list of its best paths found so far and a heap of candidates, one per predecessor. The first pass is a DP fill
+    that builds these per-cell structures, which makes it about twice as slow as `dp_solution_with_shape_info` and
+    roughly ten times slower than `dp_solution_with_moves`. Each further path only extends the candidate lists
+    along the path it came from, which is cheap next to that fill. The recursion is run with an explicit stack, so
+    long rows do not hit Python's recursion limit. The first path is the one `dp_solution_with_shape_info`
+    returns, and all paths are distinct.
+
+    Parameters:
+    n (int): Number of points in set A.
+    m (int): Number of points in set B.
+    dist (np.ndarray): Distance matrix of shape (n, m).
+    W (float): Weight for penalty calculations.
+    is_bulge (np.ndarray): Boolean array indicating which points in A are bulges.
+    is_indent (np.ndarray): Boolean array indicating which points in A are indents.
+    k (int): Maximum number of paths to yield, or None to enumerate all of them.
+    alpha (float): Penalty for an increase on a point that is not a bulge.
+    beta (float): Penalty for a decrease on a point that is not an indent.
+
+    Yields:
+    tuple: The total cost and the list of connection strings of each path.
+    """
+    # edges[v][move] = (predecessor, cost, penalty); paths[v] = [(cost, move, rank in predecessor), ...]
+    edges = {}
+    paths = {(0, 0): [(0.0, 0, 0)]}
+    candidates = {(0, 0): []}
+
+    # Best path of every cell, with the candidate heaps the later paths are drawn from
+    for i in range(n + 1):
+        for j in range(m + 1):
+            if (i, j) == (0, 0):
+                continue
+            cell_edges = {}
+            if i >= 1 and j >= 1:
+                cell_edges[SINGLE] = ((i - 1, j - 1), abs(dist[i - 1, j - 1] - W), 0)
+            if i >= 1 and j >= 3:
+                avg_dist = (dist[i - 1, j - 2] + dist[i - 1, j - 1]) / 2
+                cell_edges[INCREASE] = ((i - 1, j - 2), abs(avg_dist - W), 0 if is_bulge[i - 1] else alpha)
+            if i >= 3 and j >= 2:
+                avg_dist = (dist[i - 2, j - 1] + dist[i - 1, j - 1]) / 2
+                cell_edges[DECREASE] = ((i - 2, j - 1), abs(avg_dist - W), 0 if is_indent[i - 1] else beta)
+            edges[(i, j)] = cell_edges
+
+            heap = [(paths[u][0][0] + cost + penalty, move, 0)
+                    for move, (u, cost, penalty) in cell_edges.items() if paths[u]]
+            heapq.heapify(heap)
+            candidates[(i, j)] = heap
+            paths[(i, j)] = [heapq.heappop(heap)] if heap else []
+
+    # Cells that have no further paths; the start cell only has the empty one
+    exhausted = {(0, 0)}
+
+    def kth_path(target, target_rank):
+        # Make sure paths[target][target_rank] exists if there are that many paths, extending the candidates lazily.
+        # A path has one cell per stitch, so the predecessors still to extend are kept on an explicit stack
+        stack = [(target, target_rank)]
+        while stack:
+            v, rank = stack[-1]
+            found = paths[v]
+            if len(found) > rank or v in exhausted:
+                stack.pop()
+                continue
+            # The candidate after the last path taken from a predecessor is only needed now
+            _, move, pred_rank = found[-1]
+            u, cost, penalty = edges[v][move]
+            if len(paths[u]) <= pred_rank + 1 and u not in exhausted:
+                stack.append((u, pred_rank + 1))
+                continue
+            if len(paths[u]) > pred_rank + 1:
+                heapq.heappush(candidates[v], (paths[u][pred_rank + 1][0] + cost + penalty, move, pred_rank + 1))
+            if candidates[v]:
+                found.append(heapq.heappop(candidates[v]))
+            else:
+                exhausted.add(v)
+        return len(paths[target]) > target_rank
+
+    rank = 0
+    while (k is None or rank < k) and paths[(n, m)] and kth_path((n, m), rank):
+        cost = paths[(n, m)][rank][0]
+
+        # Walk the back-pointers of this path
+        connections = []
+        v, r = (n, m), rank
+        while v != (0, 0):
+            _, move, pred_rank = paths[v][r]
+            connections.append(connection_label(move, *v))
+            v, r = edges[v][move][0], pred_rank
+        connections.reverse()
+
+        yield cost, connections
+        rank += 1
+
+
+def fill_dp_region(dp, moves, dist, W, is_bulge, is_indent, alpha=30, beta=30, i0=1, j0=1, i1=None):
+    """
+    Fill the cells (i, j) with i0 <= i < i1 and j >= j0 of a DP table in place, keeping the others.
+
+    A cell only depends on cells with smaller or equal i and j, so after an edit that changes distances or masks
+    only from row i0 - 1 / column j0 - 1 on, the cells outside this region are still valid. With i0 = j0 = 1 this
+    is a full solve with the same costs and tie-breaking as `dp_solution_with_shape_info`, storing back-pointers
+    instead of the connection lists.
+
+    Parameters:
+    dp (np.ndarray): DP table of shape (n+1, m+1), updated in place.
+    moves (np.ndarray): Back-pointer table of shape (n+1, m+1), updated in place.
+    dist (np.ndarray): Distance matrix of shape (n, m).
+    W (float): Weight for penalty calculations.
+    is_bulge (np.ndarray): Boolean array indicating which points in A are bulges.
+    is_indent (np.ndarray): Boolean array indicating which points in A are indents.
+    alpha (float): Penalty for an increase on a point that is not a bulge.
+    beta (float): Penalty for a decrease on a point that is not an indent.
+    i0 (int): First row to fill.
+    j0 (int): First column to fill.
+    i1 (int): Row after the last one to fill, n + 1 (the last row) by default.
+    """
+    n, m = dp.shape[0] - 1, dp.shape[1] - 1
+    if i1 is None:
+        i1 = n + 1
+
+    # Work on plain Python lists to avoid numpy scalar overhead in the inner loop. Cells reach back at most two rows
+    # and columns, so only the block from (r0, c0) on is converted, with indices shifted by r0 and c0.
+    r0, c0 = max(i0 - 2, 0), max(j0 - 2, 0)
+    d = dist[r0:i1, c0:].tolist()
+    table = dp[r0:i1, c0:].tolist()
+    back = moves[r0:i1, c0:].tolist()
+    inc_penalty = [0 if b else alpha for b in is_bulge]
+    dec_penalty = [0 if b else beta for b in is_indent]
+
+    for i in range(i0, i1):
+        r = i - r0
+        row, prev, prev2 = table[r], table[r - 1], table[r - 2] if i >= 2 else None
+        d1, d2 = d[r - 1], d[r - 2] if i >= 2 else None
+        for j in range(j0, m + 1):
+            c = j - c0
+            # Single connection
+            best = prev[c - 1] + abs(d1[c - 1] - W)
+            move = SINGLE if best < np.inf else 0
+
+            # Increase connection
+            if j >= 3:
+                cand = prev[c - 2] + abs((d1[c - 2] + d1[c - 1]) / 2 - W) + inc_penalty[i - 1]
+                if cand < best:
+                    best, move = cand, INCREASE
+
+            # Decrease connection
+            if i >= 3 and j >= 2:
+                cand = prev2[c - 1] + abs((d2[c - 1] + d1[c - 1]) / 2 - W) + dec_penalty[i - 1]
+                if cand < best:
+                    best, move = cand, DECREASE
+
+            row[c] = best
+            back[r][c] = move
+
+    dp[i0:i1, j0:] = [row[j0 - c0:] for row in table[i0 - r0:]]
+    moves[i0:i1, j0:] = [row[j0 - c0:] for row in back[i0 - r0:]]
+
+
+def dp_solution_with_moves(n, m, dist, W, is_bulge, is_indent, alpha=30, beta=30):
+    """
+    Solve the DP like `dp_solution_with_shape_info`, but return a back-pointer table instead of the path dictionary.
+
+    Returns:
+    tuple: A tuple containing:
+        - dp (np.ndarray): The DP table of shape (n+1, m+1) with minimum costs.
+        - moves (np.ndarray): Back-pointer table of shape (n+1, m+1), see `backtrack_connections`.
+    """
+    dp = np.inf * np.ones((n + 1, m + 1))
+    dp[0, 0] = 0
+    moves = np.zeros((n + 1, m + 1), dtype=np.int8)
+    fill_dp_region(dp, moves, dist, W, is_bulge, is_indent, alpha, beta)
+
+    return dp, moves
+
+
+def remaining_cost_bounds(n, m, dist, W, is_bulge, is_indent):
+    """
+    Precompute the pieces of an admissible and consistent lower bound on the cost from a cell (i, j) to (n, m).
+
+    From (i, j) the remaining moves use each row i..n-1 of A exactly once. A single or an increase on row r costs
+    at least the cheapest single or increase on that row, and a decrease on rows (r-1, r) costs at least twice the
+    bound of each of its rows when both include half of the cheapest decrease, so the per-row bounds sum to a lower
+    bound on the distance costs. With di = n - i and dj = m - j, a path needs at least dj - di increases and
+    di - dj decreases, and only bulge (indent) rows ahead can take an increase (decrease) without penalty.
+
+    Returns:
+    tuple: Suffix sums of the per-row bounds (length n+1), and the number of bulge rows in i..n-1 and indent rows in
+           i+1..n-1 (both length n+2, indexed by i).
+    """
+    single = np.abs(dist - W)
+    rows_lb = single.min(axis=1)
+    if m >= 2:
+        increase = np.abs((dist[:, :-1] + dist[:, 1:]) / 2 - W)
+        rows_lb = np.minimum(rows_lb, increase.min(axis=1))
+    if n >= 2:
+        half_decrease = np.abs((dist[:-1, :] + dist[1:, :]) / 2 - W).min(axis=1) / 2
+        rows_lb[1:] = np.minimum(rows_lb[1:], half_decrease)
+        rows_lb[:-1] = np.minimum(rows_lb[:-1], half_decrease)
+
+    # Keep a small margin so rounding in the sums never makes the bound exceed the true cost
+    dist_suffix = np.append(np.cumsum(rows_lb[::-1])[::-1], 0.0) * (1 - 1e-9)
+    bulges_suffix = np.append(np.cumsum(np.asarray(is_bulge)[::-1])[::-1], [0, 0])
+    indents_suffix = np.append(np.cumsum(np.asarray(is_indent)[::-1])[::-1], [0, 0])
+
+    return dist_suffix.tolist(), bulges_suffix.tolist(), indents_suffix.tolist()
+
+
+def dp_solution_pruned(n, m, dist, W, is_bulge, is_indent, alpha=30, beta=30):
+    """
+    Solve the shape-aware DP exactly with A* over the DP lattice, skipping cells that cannot be on an optimal path.
+
+    The lower bound from `remaining_cost_bounds` is consistent, so every cell is settled with its optimal cost and
+    the search stops as soon as (n, m) is settled. Cells from which (n, m) cannot be reached at all (more than twice
+    as many points left on one ring as on the other) are never expanded. The cost is the same as
+    `dp_solution_with_shape_info`'s dp[n, m]; when several paths tie for the optimum a different one of them may
+    be returned.
+
+    Parameters:
+    n (int): Number of points in set A.
+    m (int): Number of points in set B.
+    dist (np.ndarray): Distance matrix of shape (n, m).
+    W (float): Weight for penalty calculations.
+    is_bulge (np.ndarray): Boolean array indicating which points in A are bulges.
+    is_indent (np.ndarray): Boolean array indicating which points in A are indents.
+    alpha (float): Penalty for an increase on a point that is not a bulge.
+    beta (float): Penalty for a decrease on a point that is not an indent.
+
+    Returns:
+    tuple: A tuple containing:
+        - cost (float): The minimum cost, np.inf if (n, m) is unreachable.
+        - connections (list): Connection strings of an optimal path, as in `path[(n, m)]`.
+        - evaluated (float): Fraction of the (n+1)*(m+1) cells whose cost was evaluated.
+    """
+    dist_suffix, bulges_suffix, indents_suffix = remaining_cost_bounds(n, m, dist, W, is_bulge, is_indent)
+    d = dist.tolist()
+    inc_penalty = [0 if b else alpha for b in is_bulge]
+    dec_penalty = [0 if b else beta for b in is_indent]
+
+    def lower_bound(i, j):
+        di, dj = n - i, m - j
+        if di > 2 * dj or dj > 2 * di:
+            return np.inf
+        extra = dj - di
+        return (dist_suffix[i]
+                + alpha * max(0, extra - bulges_suffix[i])
+                + beta * max(0, -extra - indents_suffix[i + 1]))
+
+    moves = np.zeros((n + 1, m + 1), dtype=np.int8)
+    cost = {(0, 0): 0.0}
+    settled = set()
+    heap = [(lower_bound(0, 0), 0, 0)]
+
+    while heap:
+        _, i, j = heapq.heappop(heap)
+        if (i, j) in settled:
+            continue
+        settled.add((i, j))
+        if (i, j) == (n, m):
+            break
+        g = cost[(i, j)]
+
+        # Same move costs as dp_solution_with_shape_info, seen from the predecessor cell
+        successors = []
+        if i < n and j < m:
+            successors.append((SINGLE, i + 1, j + 1, abs(d[i][j] - W), 0))
+            if j >= 1 and j + 2 <= m:
+                successors.append((INCREASE, i + 1, j + 2, abs((d[i][j] + d[i][j + 1]) / 2 - W), inc_penalty[i]))
+            if i >= 1 and i + 2 <= n:
+                successors.append((DECREASE, i + 2, j + 1, abs((d[i][j] + d[i + 1][j]) / 2 - W), dec_penalty[i + 1]))
+
+        for move, vi, vj, step, penalty in successors:
+            if (vi, vj) in settled:
+                continue
+            h = lower_bound(vi, vj)
+            if h == np.inf:
+                continue
+            new_cost = g + step + penalty
+            old_cost = cost.get((vi, vj), np.inf)
+            if new_cost < old_cost or (new_cost == old_cost and move < moves[vi, vj]):
+                cost[(vi, vj)] = new_cost
+                moves[vi, vj] = move
+                heapq.heappush(heap, (new_cost + h, vi, vj))
+
+    evaluated = len(cost) / ((n + 1) * (m + 1))
+    if (n, m) not in settled:
+        return np.inf, [], evaluated
+
+    return cost[(n, m)], backtrack_connections(moves, n, m), evaluated
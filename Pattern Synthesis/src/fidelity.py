@@ -0,0 +1,174 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def ring_circumference(points):
+    """
+    Computes the length of a closed ring of points.
+
+    Parameters:
+    points (np.ndarray): An array of shape (3, n) with the ring's points in order.
+
+    Returns:
+    float: The perimeter of the closed polygon, including the edge from the last point back to the first.
+    """
+    return float(np.sum(np.linalg.norm(points - np.roll(points, -1, axis=1), axis=0)))
+
+
+def chamfer_hausdorff(points_P, points_Q):
+    """
+    Computes the symmetric Chamfer and Hausdorff distances between two point sets with KD-tree nearest neighbours.
+
+    Parameters:
+    points_P (np.ndarray): An array of shape (3, n).
+    points_Q (np.ndarray): An array of shape (3, m).
+
+    Returns:
+    tuple: The Chamfer distance (average of the two mean nearest-neighbour distances) and the Hausdorff distance.
+    """
+    d_PQ, _ = cKDTree(points_Q.T).query(points_P.T)
+    d_QP, _ = cKDTree(points_P.T).query(points_Q.T)
+
+    chamfer = 0.5 * (np.mean(d_PQ) + np.mean(d_QP))
+    hausdorff = max(np.max(d_PQ), np.max(d_QP))
+
+    return float(chamfer), float(hausdorff)
+
+
+def simulate_row(points_1, points_2, indices, W):
+    """
+    Simulates where the stitches of a row end up when every stitch has height W.
+
+    Each stitch starts from the point(s) of the previous ring it is worked into (their mean for a decrease) and
+    grows a length W towards the slice point it was matched with, so each increase gives two stitch tops.
+
+    Parameters:
+    points_1 (np.ndarray): The previous ring (shape: (3, n)).
+    points_2 (np.ndarray): The slice being reproduced (shape: (3, m)).
+    indices (list): (stitch_type, a_indices, b_indices) tuples returned by `generate_row_pattern`.
+    W (float): Stitch width, also used as the stitch height.
+
+    Returns:
+    tuple: Simulated stitch tops of shape (3, number of stitches made) and the length of every strand
+           from its base to the matched slice point. Both are empty when `indices` is empty.
+    """
+    if not indices:
+        return np.zeros((3, 0)), np.zeros(0)
+
+    a_idx = []
+    b_idx = []
+    for stitch_type, a_indices, b_indices in indices:
+        for b in b_indices:
+            a_idx.append(a_indices)
+            b_idx.append(b)
+
+    # Decreases work two points together, so the base is their mean
+    bases = np.stack([points_1[:, a].mean(axis=1) for a in a_idx], axis=1)
+    targets = points_2[:, b_idx]
+
+    direction = targets - bases
+    length = np.linalg.norm(direction, axis=0)
+    tops = bases + W * direction / np.where(length > 0, length, 1)
+
+    return tops, length
+
+
+def score_row(points_1, points_2, indices, W):
+    """
+    Scores how well one solved row reproduces its slice.
+
+    Parameters:
+    points_1 (np.ndarray): The previous ring (shape: (3, n)).
+    points_2 (np.ndarray): The slice being reproduced (shape: (3, m)).
+    indices (list): (stitch_type, a_indices, b_indices) tuples returned by `generate_row_pattern`.
+    W (float): Stitch width.
+
+    Returns:
+    dict: Per-row errors:
+        - 'solved': False when the DP found no path for the row (empty `indices`); all errors are then NaN.
+        - 'circumference' / 'implied_circumference': slice perimeter and the perimeter of the stitches made (count * W).
+        - 'circumference_error': relative error of the implied circumference.
+        - 'stitch_length_error': mean |stitch length - W| over all strands of the row.
+        - 'chamfer' / 'hausdorff': distances between the simulated stitch tops and the slice.
+        - 'tops': the simulated stitch tops, for plotting next to the slice.
+    """
+    tops, stitch_lengths = simulate_row(points_1, points_2, indices, W)
+
+    circumference = ring_circumference(points_2)
+
+    if not indices:
+        return {
+            'solved': False,
+            'circumference': circumference,
+            'implied_circumference': np.nan,
+            'circumference_error': np.nan,
+            'stitch_length_error': np.nan,
+            'chamfer': np.nan,
+            'hausdorff': np.nan,
+            'tops': tops,
+        }
+
+    implied_circumference = tops.shape[1] * W
+
+    chamfer, hausdorff = chamfer_hausdorff(tops, points_2)
+
+    return {
+        'solved': True,
+        'circumference': circumference,
+        'implied_circumference': implied_circumference,
+        'circumference_error': (implied_circumference - circumference) / circumference,
+        'stitch_length_error': float(np.mean(np.abs(stitch_lengths - W))),
+        'chamfer': chamfer,
+        'hausdorff': hausdorff,
+        'tops': tops,
+    }
+
+
+def score_segment(patterns_data, W=0.15):
+    """
+    Scores a whole segment from the row data returned by `get_crochet_pattern` / `iter_crochet_rows`.
+
+    Parameters:
+    patterns_data (iterable): Row data dicts with 'row', 'points_1', 'points_2' and 'indices'.
+    W (float): Stitch width the pattern was solved with.
+
+    Returns:
+    dict: 'rows' with the `score_row` result of every row, 'unsolved' with the pattern row numbers ('Row k') the
+          DP found no path for, the mean absolute 'circumference_error' and 'stitch_length_error' over the solved
+          rows, and 'chamfer' / 'hausdorff' between all simulated stitch tops and the slices of the solved rows.
+          The aggregates are NaN when no row was solved.
+    """
+    rows = []
+    unsolved = []
+    all_tops = []
+    all_slices = []
+
+    for row_data in patterns_data:
+        points_1 = row_data['points_1']
+        points_2 = row_data['points_2']
+        indices = row_data['indices']
+
+        row = score_row(points_1, points_2, indices, W)
+        rows.append(row)
+        if row['solved']:
+            all_tops.append(row['tops'])
+            all_slices.append(points_2)
+        else:
+            unsolved.append(row_data['row'])
+
+    # Unsolved rows have no stitches, so they are left out of the segment-wide errors
+    solved_rows = [row for row in rows if row['solved']]
+    if not solved_rows:
+        return {'rows': rows, 'unsolved': unsolved, 'circumference_error': np.nan,
+                'stitch_length_error': np.nan, 'chamfer': np.nan, 'hausdorff': np.nan}
+
+    chamfer, hausdorff = chamfer_hausdorff(np.hstack(all_tops), np.hstack(all_slices))
+
+    return {
+        'rows': rows,
+        'unsolved': unsolved,
+        'circumference_error': float(np.mean([abs(row['circumference_error']) for row in solved_rows])),
+        'stitch_length_error': float(np.mean([row['stitch_length_error'] for row in solved_rows])),
+        'chamfer': chamfer,
+        'hausdorff': hausdorff,
+    }
@@ -1,11 +1,11 @@
 import json
 import numpy as np
 import os
-import open3d as o3d # type: ignore
 from utils import interpolate_colors, visualizer, visualize_animation, generate_row_pattern
 from dp import dist_matrix, compute_bulges_indents, dp_solution_with_shape_info
-from dfs import dfs_traversal, build_graph
-from write_pattern import reform_crochet_pattern
+from write_pattern import format_row, write_rows
+from congruence import new_shape_index, lookup_row_pair, add_row_pair, dedup_report
+from batch import solve_row_pairs
 import matplotlib.pyplot as plt
 from time import time
 
@@ -15,38 +15,41 @@ def load_json(file_path):
         return json.load(f)
 
 
-def get_segments(folder_path):
+def get_segments(folder_path, echo=True):
     segments = []
     for file_name in os.listdir(folder_path):
         if file_name.endswith('.json'):
-            print(f"Reading.......{file_name}")
+            if echo:
+                print(f"Reading.......{file_name}")
             file_path = os.path.join(folder_path, file_name)
             json_data = load_json(file_path)
             segments.append((file_name, json_data))
     return segments
 
 
-def get_crochet_pattern(data, color_start, color_end):
+def iter_crochet_rows(data, color_start, color_end, stitch_width=0.15, alpha=30, beta=30, start=0, stop=None,
+                      shape_index=None, segment_name=None, solved_connections=None):
     """
-    Generates crochet patterns and connection data for visualization, returning the complete pattern.
+    Generates the crochet pattern row by row, yielding each row as soon as it is solved.
+    Row k only depends on slices k and k+1, so `start`/`stop` select rows without solving the others.
+    With a `shape_index` (see `congruence.new_shape_index`) row pairs congruent to an already solved one reuse its
+    connections, and are recorded under `segment_name`.
+    `solved_connections` holds already solved connections for every row (e.g. from `batch.solve_row_pairs`).
+    `stitch_width`, `alpha` and `beta` can be tuned per yarn, see `sweep.sweep_crochet_parameters`.
     """
 
-    cro_pattern = ''
     # Extract vertices and store them in a list
     slice_names = list(data.keys())
     all_vertices = [np.array(data[slice_name]).T for slice_name in slice_names]
     
-    stitch_width = 0.15
     W = stitch_width
 
     num_rows = len(all_vertices) - 1
     
     colors = interpolate_colors(color_start, color_end, num_rows)
 
-    patterns_data = []  # Store all necessary data for visualization
-
     # Generate crochet patterns row by row
-    for loop in range(num_rows):
+    for loop in range(num_rows)[start:stop]:
         points_1 = all_vertices[loop]
         points_2 = all_vertices[loop + 1]
 
@@ -59,25 +62,60 @@ def get_crochet_pattern(data, color_start, color_end):
             pass 
         ###########################
 
-        dist = dist_matrix(points_1, points_2)
-        is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
-        dp,path = dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent)
-        #print(f'Row {loop + 1}: (going from: {n} to {m})')
-        connections = path[(n, m)]
+        if solved_connections is not None:
+            connections = solved_connections[loop]
+        else:
+            connections = None
+            dist = dist_matrix(points_1, points_2)
+            is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
+
+        if connections is None and shape_index is not None:
+            connections = lookup_row_pair(shape_index, points_1, points_2, dist, is_bulge, is_indent, (W, alpha, beta), (segment_name, loop + 1))
+
+        if connections is None:
+            dp,path = dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent, alpha, beta)
+            #print(f'Row {loop + 1}: (going from: {n} to {m})')
+            connections = path[(n, m)]
+            if shape_index is not None:
+                add_row_pair(shape_index, points_1, points_2, dist, is_bulge, is_indent, (W, alpha, beta), (segment_name, loop + 1), connections)
        
         row_p, indices = generate_row_pattern(points_1, points_2, connections)
-        p = reform_crochet_pattern(row_p)
-        #print(p)
-        # Store row data for later visualization
+        # Row data for writing and later visualization
         row_data = {
+            'row': loop + 1,
+            'text': format_row(loop + 1, row_p, m),
             'points_1': points_1,
             'points_2': points_2,
             'indices':indices,
             'color': colors[loop]
         }
-        patterns_data.append(row_data)
+        yield row_data
 
-        cro_pattern += f'Row {loop + 1}: {p}  ({m})\n'
+
+def get_crochet_row(data, k, color_start, color_end, stitch_width=0.15, alpha=30, beta=30):
+    """
+    Solves only row k (1-based, as printed in the pattern) and returns its row data.
+    """
+    num_rows = len(data) - 1
+    if not 1 <= k <= num_rows:
+        raise IndexError(f'Row {k} is out of range, the segment has rows 1 to {num_rows}.')
+
+    return next(iter_crochet_rows(data, color_start, color_end, stitch_width, alpha, beta, start=k - 1, stop=k))
+
+
+def get_crochet_pattern(data, color_start, color_end, stitch_width=0.15, alpha=30, beta=30, batch_small_rows=False):
+    """
+    Generates crochet patterns and connection data for visualization, returning the complete pattern.
+    With `batch_small_rows` all rows are solved up front and small row pairs (magic rings, narrow tips) are batched.
+    """
+    solved_connections = None
+    if batch_small_rows:
+        all_vertices = [np.array(points).T for points in data.values()]
+        solved_connections = solve_row_pairs(list(zip(all_vertices[:-1], all_vertices[1:])), stitch_width, alpha, beta)
+
+    patterns_data = list(iter_crochet_rows(data, color_start, color_end, stitch_width, alpha, beta,
+                                           solved_connections=solved_connections))
+    cro_pattern = ''.join(row_data['text'] for row_data in patterns_data)
 
     return cro_pattern, patterns_data
 
@@ -166,7 +204,83 @@ def add_first_row(new_row, data):
 
 
 
-def main():
+def write_model_pattern(segmented_parts, metadata, file, completed_segments=None, on_segment_done=None, ax=None, echo=True,
+                        shape_index=None):
+    """
+    Writes the pattern of every segment of a model to `file`, handling sew-on components from `metadata`.
+
+    Segments in `completed_segments` are skipped (their sew-on rows are still added to the parts they attach to),
+    `on_segment_done(segment_name)` is called once a segment's rows are fully written, and sew-on components
+    are visualized on `ax` when it is given. A `shape_index` is shared by all segments so congruent ones are solved once.
+    """
+    if completed_segments is None:
+        completed_segments = set()
+    log = print if echo else (lambda *args, **kwargs: None)
+
+    for segment_name, data in segmented_parts:
+
+        if segment_name not in completed_segments:
+            log("\n\nCURRENT SEGMENT: ", segment_name)
+            log()
+
+            color_start = np.array([0.5, 0, 0.5])  # Dark purple
+            color_end = np.array([1, 0.5, 1])  # Light purple
+
+            last_rows_connections = []
+            n_sew_ons = 0
+
+            if segment_name in metadata:
+
+                connected_components = metadata.get(segment_name)
+                # Get a list of connections with 0
+                sew_ons = [entry for entry in connected_components if entry[1] == 0]
+                n_sew_ons = len(sew_ons)
+
+                for seg,_ in sew_ons:
+
+                    seg_data  = next((d for s, d in segmented_parts if s == seg), None)
+
+                    last_row = get_last_row(seg, segmented_parts)
+                    new_row = [[x, y, z + 0.2] for x, y, z in last_row]
+
+                    add_last_row(seg, new_row, segmented_parts)
+
+                    if seg not in completed_segments:
+                        log(f"processing {seg}")
+                        file.write(f'\n{seg}\n')
+                        patterns_data = write_rows(iter_crochet_rows(seg_data, color_start, color_end, shape_index=shape_index, segment_name=seg), file, echo)
+                        # Visualize the generated patterns for the current segment
+                        if ax is not None:
+                            visualizer(ax, patterns_data)
+                        completed_segments.add(seg)
+                        if on_segment_done:
+                            on_segment_done(seg)
+
+                    last_rows_connections.append(new_row)
+
+            log(f"processing {segment_name}")
+            completed_segments.add(segment_name)
+            file.write(f'\n{segment_name}\n')
+
+            if last_rows_connections:
+                last_rows_connections = [point for sublist in last_rows_connections for point in sublist]
+                data['slice_a'] = last_rows_connections
+                s = f"NOTE: For this segment, sew-on across all {n_sew_ons} components ({', '.join(s for s, _ in sew_ons)}) to attach.....\n"
+                log(s)
+                file.write(s)
+
+            ################# GET PATTERN FOR SEGMENT #########################
+            # Stream crochet pattern rows to the file as they are solved, keeping data needed for visualization
+            patterns_data = write_rows(iter_crochet_rows(data, color_start, color_end, shape_index=shape_index,
+                                                           segment_name=segment_name), file, echo)
+            # Visualize the generated patterns for the current segment
+            #visualizer(ax, patterns_data)
+            ###################################################################
+            if on_segment_done:
+                on_segment_done(segment_name)
+
+
+def main(shape_tol=1e-3):
 
     t1 = time()
     ######## SEGMENTS ###########
@@ -199,71 +313,19 @@ def main():
 
 
     #completed_segments = {name for name, _ in segmented_parts}
-    completed_segments = set()
-
-    with open('none.txt', 'w') as file:
-        for segment_name, data in segmented_parts:
-
-            if segment_name not in completed_segments:
-                print("\n\nCURRENT SEGMENT: ", segment_name)
-                print()
 
-                color_start = np.array([0.5, 0, 0.5])  # Dark purple
-                color_end = np.array([1, 0.5, 1])  # Light purple
+    # Congruent segments and rings (translated, rotated or mirrored copies such as left/right limbs) are solved once.
+    # Row pairs whose distances agree within shape_tol (model units) count as congruent, see new_shape_index
+    shape_index = new_shape_index(tol=shape_tol)
 
-                last_rows_connections = []
-                n_sew_ons = 0
-
-                if segment_name in metadata:
-                    
-                    connected_components = metadata.get(segment_name)
-                    # Get a list of connections with 0
-                    sew_ons = [entry for entry in connected_components if entry[1] == 0]
-                    n_sew_ons = len(sew_ons)
-
-                    for seg,_ in sew_ons:
-                        
-                        seg_data  = next((d for s, d in segmented_parts if s == seg), None)
-
-                        last_row = get_last_row(seg, segmented_parts)
-                        new_row = [[x, y, z + 0.2] for x, y, z in last_row]
+    with open('none.txt', 'w') as file:
+        write_model_pattern(segmented_parts, metadata, file, ax=ax, shape_index=shape_index)
 
-                        add_last_row(seg, new_row, segmented_parts)
+    report = dedup_report(shape_index)
+    print(f"Solved {report['solved']} row pairs, reused {len(report['reused'])}")
+    for segment, source in report['congruent_segments']:
+        print(f"{segment} reuses the pattern of {source}")
 
-                        if seg not in completed_segments:
-                            print(f"processing {seg}")
-                            file.write(f'\n{seg}\n')
-                            cro_pattern, patterns_data = get_crochet_pattern(seg_data, color_start, color_end)
-                            print(cro_pattern)
-                            file.write(cro_pattern)
-                            # Visualize the generated patterns for the current segment
-                            visualizer(ax, patterns_data)
-                            completed_segments.add(seg)
-
-                        last_rows_connections.append(new_row)
-
-                        
-                        
-                print(f"processing {segment_name}")
-                completed_segments.add(segment_name)
-                file.write(f'\n{segment_name}\n')
-
-                if last_rows_connections:
-                    last_rows_connections = [point for sublist in last_rows_connections for point in sublist]
-                    data['slice_a'] = last_rows_connections
-                    s = f"NOTE: For this segment, sew-on across all {n_sew_ons} components ({', '.join(s for s, _ in sew_ons)}) to attach.....\n"
-                    print(s)
-                    file.write(s)
-
-                ################# GET PATTERN FOR SEGMENT #########################
-                # Generate crochet patterns and data needed for visualization
-                cro_pattern, patterns_data = get_crochet_pattern(data, color_start, color_end)
-                print(cro_pattern)
-                file.write(cro_pattern)
-                # Visualize the generated patterns for the current segment
-                #visualizer(ax, patterns_data)
-                ###################################################################
-                
     # Display the visualization for the current segment
     #plt.show()
     # Close the plot to avoid overlap in subsequent iterations
@@ -0,0 +1,137 @@
+import numpy as np
+from dp import dist_matrix, compute_bulges_indents, fill_dp_region, dp_solution_with_moves, backtrack_connections
+from utils import generate_row_pattern
+from write_pattern import format_row
+
+
+def solve_row_state(points_1, points_2, W, alpha, beta):
+    """
+    Fully solves one row pair and keeps everything needed to update it later.
+    """
+    n = points_1.shape[1]
+    m = points_2.shape[1]
+
+    dist = dist_matrix(points_1, points_2)
+    is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
+    dp, moves = dp_solution_with_moves(n, m, dist, W, is_bulge, is_indent, alpha, beta)
+
+    return {'dist': dist, 'is_bulge': is_bulge, 'is_indent': is_indent, 'dp': dp, 'moves': moves}
+
+
+def update_row_state(state, points_1, points_2, W, alpha, beta):
+    """
+    Updates a row pair after one of its rings moved, refilling only the DP cells that can have changed.
+
+    A changed distance dist[r, c] only reaches cells (i, j) with i > r and j > c, while a changed bulge/indent mask
+    entry at r reaches every column of the rows i > r. So the rows below the first changed mask entry are refilled
+    in full, the rectangle below and right of the first changed distance row and column is refilled, and the rest
+    of the table is kept. Only mask entries whose value flips count. Moving a ring also moves its centroid, so an
+    edit of ring A can flip mask entries far from the edited points and then refills close to the whole table.
+
+    Returns:
+    float: The fraction of DP cells that were refilled.
+    """
+    n = points_1.shape[1]
+    m = points_2.shape[1]
+
+    dist = dist_matrix(points_1, points_2)
+    is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
+
+    if state['dist'].shape != (n, m):
+        state.update(solve_row_state(points_1, points_2, W, alpha, beta))
+        return 1.0
+
+    changed_rows, changed_cols = np.nonzero(dist != state['dist'])
+    changed_masks = np.nonzero((is_bulge != state['is_bulge']) | (is_indent != state['is_indent']))[0]
+
+    if len(changed_rows) == 0 and len(changed_masks) == 0:
+        return 0.0
+
+    # Rows from i_mask on are refilled in full, rows i0 to i_mask - 1 only from column j0 on
+    i_mask = min(changed_masks) + 1 if len(changed_masks) else n + 1
+    i0, j0 = (min(changed_rows) + 1, min(changed_cols) + 1) if len(changed_rows) else (i_mask, 1)
+
+    if i0 < i_mask:
+        fill_dp_region(state['dp'], state['moves'], dist, W, is_bulge, is_indent, alpha, beta, i0, j0, i_mask)
+    if i_mask <= n:
+        fill_dp_region(state['dp'], state['moves'], dist, W, is_bulge, is_indent, alpha, beta, i_mask, 1)
+    state.update({'dist': dist, 'is_bulge': is_bulge, 'is_indent': is_indent})
+
+    return (max(i_mask - i0, 0) * (m - j0 + 1) + (n - i_mask + 1) * m) / ((n + 1) * (m + 1))
+
+
+def row_text(session, loop):
+    """
+    Writes the pattern line of row pair `loop` from its back-pointer table.
+    """
+    points_1 = session['vertices'][loop]
+    points_2 = session['vertices'][loop + 1]
+    n = points_1.shape[1]
+    m = points_2.shape[1]
+
+    connections = backtrack_connections(session['rows'][loop]['moves'], n, m)
+    row_p, _ = generate_row_pattern(points_1, points_2, connections)
+
+    return format_row(loop + 1, row_p, m)
+
+
+def new_session(data, stitch_width=0.15, alpha=30, beta=30):
+    """
+    Starts an editing session on a segment, solving every row once and keeping the per-row DP state in memory.
+
+    Parameters:
+    data (dict): Slice name -> list of [x, y, z] points, as loaded from the segment json.
+    stitch_width (float): Stitch width W.
+    alpha (float): Penalty for an unnecessary increase.
+    beta (float): Penalty for an unnecessary decrease.
+
+    Returns:
+    dict: The session, to be passed to `edit_ring` and `session_pattern`.
+    """
+    slice_names = list(data.keys())
+    all_vertices = [np.array(data[slice_name]).T for slice_name in slice_names]
+
+    session = {'vertices': all_vertices, 'W': stitch_width, 'alpha': alpha, 'beta': beta, 'rows': [], 'text': []}
+    for loop in range(len(all_vertices) - 1):
+        session['rows'].append(solve_row_state(all_vertices[loop], all_vertices[loop + 1], stitch_width, alpha, beta))
+        session['text'].append(row_text(session, loop))
+
+    return session
+
+
+def edit_ring(session, k, points):
+    """
+    Replaces the points of ring k and re-solves only the two row pairs that touch it.
+
+    Parameters:
+    session (dict): Session from `new_session`.
+    k (int): Zero-based index of the edited slice.
+    points (array-like): The new points, as a (3, n) array or a list of [x, y, z].
+
+    Returns:
+    list: (row number, old text, new text) for every row whose pattern line changed.
+    """
+    points = np.asarray(points, dtype=float)
+    if points.shape[0] != 3:
+        points = points.T
+    session['vertices'][k] = points
+
+    diff = []
+    for loop in (k - 1, k):
+        if 0 <= loop < len(session['rows']):
+            update_row_state(session['rows'][loop], session['vertices'][loop], session['vertices'][loop + 1],
+                             session['W'], session['alpha'], session['beta'])
+            old_text = session['text'][loop]
+            new_text = row_text(session, loop)
+            if new_text != old_text:
+                session['text'][loop] = new_text
+                diff.append((loop + 1, old_text, new_text))
+
+    return diff
+
+
+def session_pattern(session):
+    """
+    Returns the current pattern of the session, in the format of `get_crochet_pattern`.
+    """
+    return ''.join(session['text'])
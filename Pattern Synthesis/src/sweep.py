@@ -0,0 +1,106 @@
+import itertools
+import numpy as np
+from dp import dist_matrix, compute_bulges_indents, dp_solution_batched, backtrack_connections, MOVE_STEPS, SINGLE, INCREASE, DECREASE
+
+
+def count_stitches(moves, n, m):
+    """
+    Counts the stitch types on the optimal path of a back-pointer table.
+
+    Parameters:
+    moves (np.ndarray): Back-pointer table of shape (n+1, m+1).
+    n (int): Number of points in set A.
+    m (int): Number of points in set B.
+
+    Returns:
+    dict: Number of 'sc', 'inc' and 'dec' stitches in the row.
+    """
+    counts = {'sc': 0, 'inc': 0, 'dec': 0}
+    names = {SINGLE: 'sc', INCREASE: 'inc', DECREASE: 'dec'}
+    i, j = n, m
+    while (i, j) != (0, 0):
+        move = int(moves[i, j])
+        if move == 0:
+            break
+        counts[names[move]] += 1
+        di, dj = MOVE_STEPS[move]
+        i, j = i - di, j - dj
+
+    return counts
+
+
+def sweep_crochet_parameters(data, W_values, alpha_values=(30,), beta_values=(30,)):
+    """
+    Solves every row of a segment for all combinations of stitch width and shaping penalties.
+
+    The distance matrix and bulge/indent masks are computed once per row pair and all
+    (W, alpha, beta) combinations are then solved together in a single batched DP.
+
+    Parameters:
+    data (dict): Slice name -> list of [x, y, z] points, as loaded from the segment json.
+    W_values (iterable): Stitch widths to try.
+    alpha_values (iterable): Penalties for an unnecessary increase to try.
+    beta_values (iterable): Penalties for an unnecessary decrease to try.
+
+    Returns:
+    list: One dict per combination, in itertools.product order, with keys 'W', 'alpha',
+          'beta', 'cost' (total over all rows) and 'rows' (per-row dicts with 'sc', 'inc',
+          'dec', 'stitches' and 'cost').
+
+    Raises:
+    ValueError: If any of the parameter grids is empty.
+    """
+    slice_names = list(data.keys())
+    all_vertices = [np.array(data[slice_name]).T for slice_name in slice_names]
+
+    combinations = list(itertools.product(W_values, alpha_values, beta_values))
+    if not combinations:
+        raise ValueError('W_values, alpha_values and beta_values must each contain at least one value.')
+    W, alpha, beta = (np.array(values, dtype=float) for values in zip(*combinations))
+
+    results = [{'W': w, 'alpha': a, 'beta': b, 'cost': 0.0, 'rows': []} for w, a, b in combinations]
+
+    for loop in range(len(all_vertices) - 1):
+        points_1 = all_vertices[loop]
+        points_2 = all_vertices[loop + 1]
+
+        n = points_1.shape[1]
+        m = points_2.shape[1]
+
+        dist = dist_matrix(points_1, points_2)
+        is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
+        dp, moves = dp_solution_batched(dist, W, is_bulge, is_indent, alpha, beta)
+
+        for k, result in enumerate(results):
+            row = count_stitches(moves[k], n, m)
+            row['stitches'] = m
+            row['cost'] = float(dp[k, n, m])
+            result['rows'].append(row)
+            result['cost'] += row['cost']
+
+    return results
+
+
+def get_connections(data, row, W, alpha=30, beta=30):
+    """
+    Re-solves a single row for one parameter combination picked from a sweep.
+
+    Parameters:
+    data (dict): Slice name -> list of [x, y, z] points.
+    row (int): Zero-based row index (row k connects slice k to slice k+1).
+    W (float): Stitch width.
+    alpha (float): Penalty for an unnecessary increase.
+    beta (float): Penalty for an unnecessary decrease.
+
+    Returns:
+    list: Connection strings in the format returned by `dp_solution_with_shape_info`.
+    """
+    slice_names = list(data.keys())
+    points_1 = np.array(data[slice_names[row]]).T
+    points_2 = np.array(data[slice_names[row + 1]]).T
+
+    dist = dist_matrix(points_1, points_2)
+    is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
+    _, moves = dp_solution_batched(dist, W, is_bulge, is_indent, alpha, beta)
+
+    return backtrack_connections(moves[0], points_1.shape[1], points_2.shape[1])
@@ -0,0 +1,33 @@
+import numpy as np
+from dp import dist_matrix, compute_bulges_indents, dp_solution_with_shape_info
+from batch import solve_row_pairs
+
+
+def random_ring(rng, n, z):
+    theta = np.sort(rng.uniform(-np.pi, np.pi, n))
+    radius = 1 + 0.3 * rng.random(n)
+    return np.stack([radius * np.cos(theta), radius * np.sin(theta), np.full(n, z)])
+
+
+def serial_connections(points_1, points_2, W):
+    n = points_1.shape[1]
+    m = points_2.shape[1]
+    dist = dist_matrix(points_1, points_2)
+    is_bulge, is_indent = compute_bulges_indents(points_1, points_2)
+    _, path = dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent)
+    return path[(n, m)]
+
+
+def test_solve_row_pairs_matches_serial():
+    rng = np.random.default_rng(0)
+    # Mostly small pairs that get batched (several share each m), plus a few above max_points
+    sizes = [tuple(rng.integers(3, 13, 2)) for _ in range(60)] + [(25, 30), (30, 22)]
+    pairs = [(random_ring(rng, n, 0), random_ring(rng, m, 0.15)) for n, m in sizes]
+
+    connections = solve_row_pairs(pairs, 0.15, max_points=12)
+
+    assert connections == [serial_connections(points_1, points_2, 0.15) for points_1, points_2 in pairs]
+
+
+def test_solve_row_pairs_empty():
+    assert solve_row_pairs([], 0.15) == []
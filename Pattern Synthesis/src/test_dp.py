@@ -0,0 +1,109 @@
+import sys
+import numpy as np
+import pytest
+from dp import (dp_solution_with_shape_info, k_best_paths, dp_solution_pruned, connection_label, SINGLE, INCREASE,
+                DECREASE)
+
+
+def random_lattice(rng, n, m):
+    dist = rng.uniform(0, 0.5, (n, m))
+    is_bulge = rng.random(n) < 0.5
+    is_indent = rng.random(n) < 0.5
+    return dist, is_bulge, is_indent
+
+
+def all_paths(n, m, dist, W, is_bulge, is_indent, alpha, beta):
+    """
+    Enumerates every path to (n, m) by brute force, with the move rules of the DP.
+    """
+    def paths_to(i, j):
+        if (i, j) == (0, 0):
+            return [(0.0, [])]
+        found = []
+        if i >= 1 and j >= 1:
+            for cost, connections in paths_to(i - 1, j - 1):
+                found.append((cost + abs(dist[i - 1, j - 1] - W), connections + [connection_label(SINGLE, i, j)]))
+        if i >= 1 and j >= 3:
+            step = abs((dist[i - 1, j - 2] + dist[i - 1, j - 1]) / 2 - W) + (0 if is_bulge[i - 1] else alpha)
+            for cost, connections in paths_to(i - 1, j - 2):
+                found.append((cost + step, connections + [connection_label(INCREASE, i, j)]))
+        if i >= 3 and j >= 2:
+            step = abs((dist[i - 2, j - 1] + dist[i - 1, j - 1]) / 2 - W) + (0 if is_indent[i - 1] else beta)
+            for cost, connections in paths_to(i - 2, j - 1):
+                found.append((cost + step, connections + [connection_label(DECREASE, i, j)]))
+        return found
+
+    return paths_to(n, m)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_k_best_paths_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(1, 8, 2)
+    dist, is_bulge, is_indent = random_lattice(rng, n, m)
+    W, alpha, beta = 0.25, 0.3, 0.2
+
+    expected = all_paths(n, m, dist, W, is_bulge, is_indent, alpha, beta)
+    found = list(k_best_paths(n, m, dist, W, is_bulge, is_indent, None, alpha, beta))
+
+    # Every path exactly once, cheapest first
+    assert len(found) == len(expected)
+    assert sorted(tuple(connections) for _, connections in found) == sorted(tuple(c) for _, c in expected)
+    assert np.allclose([cost for cost, _ in found], sorted(cost for cost, _ in expected))
+
+    if found:
+        _, path = dp_solution_with_shape_info(n, m, dist, W, is_bulge, is_indent, alpha, beta)
+        assert found[0][1] == path[(n, m)]
+
+
+def test_k_best_paths_stops_after_k():
+    rng = np.random.default_rng(0)
+    dist, is_bulge, is_indent = random_lattice(rng, 6, 7)
+
+    assert len(list(k_best_paths(6, 7, dist, 0.25, is_bulge, is_indent, k=3))) == 3
+
+
+def test_k_best_paths_long_row():
+    # A path has one cell per stitch, so a row longer than the recursion limit must still work
+    n, m = 300, 330
+    dist = np.full((n, m), 0.15)
+    is_bulge = np.ones(n, dtype=bool)
+    is_indent = np.ones(n, dtype=bool)
+
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(200)
+    try:
+        assert len(list(k_best_paths(n, m, dist, 0.15, is_bulge, is_indent, k=2))) == 2
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_dp_solution_pruned_matches_dp(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(1, 40, 2)
+    dist, is_bulge, is_indent = random_lattice(rng, n, m)
+
+    dp, _ = dp_solution_with_shape_info(n, m, dist, 0.25, is_bulge, is_indent, 0.3, 0.2)
+    cost, _, evaluated = dp_solution_pruned(n, m, dist, 0.25, is_bulge, is_indent, 0.3, 0.2)
+
+    # Unreachable rows are np.inf in both
+    assert cost == pytest.approx(dp[n, m])
+    assert 0 <= evaluated <= 1
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_dp_solution_pruned_path_has_its_cost(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(1, 8, 2)
+    dist, is_bulge, is_indent = random_lattice(rng, n, m)
+
+    expected = {tuple(connections): cost
+                for cost, connections in all_paths(n, m, dist, 0.25, is_bulge, is_indent, 0.3, 0.2)}
+    cost, connections, _ = dp_solution_pruned(n, m, dist, 0.25, is_bulge, is_indent, 0.3, 0.2)
+
+    if expected:
+        assert expected[tuple(connections)] == pytest.approx(cost)
+        assert cost == pytest.approx(min(expected.values()))
+    else:
+        assert cost == np.inf
@@ -1,3 +1,6 @@
+import sys
+
+
 def reform_crochet_pattern(pattern):
     """
     Reformats the crochet pattern by compressing consecutive identical stitches into a single entry with a count.
@@ -38,4 +41,45 @@ def reform_crochet_pattern(pattern):
         result.append(current_stitch)
 
     # Join the result list into a single string with ', ' as separator
-    return ', '.join(result)
\ No newline at end of file
+    return ', '.join(result)
+
+
+def format_row(row, row_pattern, stitches):
+    """
+    Writes the pattern line of one row, e.g. 'Row 3: sc x7, inc, sc x7  (16)'.
+
+    Parameters:
+    row (int): The row number.
+    row_pattern (str): The row pattern string returned by `generate_row_pattern`.
+    stitches (int): Number of stitches at the end of the row.
+
+    Returns:
+    str: The pattern line, ending with a newline.
+    """
+    return f'Row {row}: {reform_crochet_pattern(row_pattern)}  ({stitches})\n'
+
+
+def write_rows(rows, file, echo=True):
+    """
+    Writes pattern rows to a file as they are produced, flushing after every row so the
+    first rows show up immediately and a partial pattern survives an interruption.
+
+    Parameters:
+    rows (iterable): Row data dicts with a 'text' entry, e.g. from `iter_crochet_rows`.
+    file (file object): Open text file the rows are written to.
+    echo (bool): Also print each row to stdout as it is written.
+
+    Returns:
+    list: The row data dicts, for visualization.
+    """
+    patterns_data = []
+
+    for row_data in rows:
+        file.write(row_data['text'])
+        file.flush()
+        if echo:
+            sys.stdout.write(row_data['text'])
+            sys.stdout.flush()
+        patterns_data.append(row_data)
+
+    return patterns_data